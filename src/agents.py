@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
 from typing import Annotated, Any, Dict, Sequence, TypedDict
 
@@ -41,20 +42,23 @@ def market_data_agent(state: AgentState):
     else:
         start_date = data["start_date"]
 
-    # Get the historical price data
-    prices = get_prices(
-        ticker=data["ticker"], 
-        start_date=start_date, 
-        end_date=end_date,
-    )
-
-    # Get the financial metrics
-    financial_metrics = get_financial_metrics(
-        ticker=data["ticker"], 
-        report_period=end_date, 
-        period='ttm', 
-        limit=1,
-    )
+    # Fetch the historical price data and the financial metrics concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        prices_future = executor.submit(
+            get_prices,
+            ticker=data["ticker"], 
+            start_date=start_date, 
+            end_date=end_date,
+        )
+        financial_metrics_future = executor.submit(
+            get_financial_metrics,
+            ticker=data["ticker"], 
+            report_period=end_date, 
+            period='ttm', 
+            limit=1,
+        )
+        prices = prices_future.result()
+        financial_metrics = financial_metrics_future.result()
 
     return {
         "messages": messages,
@@ -1,11 +1,33 @@
 from datetime import datetime, timedelta
+import json
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
 from src.tools import get_price_data
 from src.agents import run_hedge_fund
 
+def calculate_performance_metrics(portfolio_values):
+    """Calculate Sharpe ratio and maximum drawdown along the last axis.
+
+    Accepts a single series of portfolio values or a 2-D array with one
+    series per row, so several backtests can be scored in one call.
+    """
+    values = np.asarray(portfolio_values, dtype=float)
+
+    # Sharpe Ratio (assuming 252 trading days in a year)
+    daily_returns = np.diff(values, axis=-1) / values[..., :-1]
+    mean_daily_return = np.nanmean(daily_returns, axis=-1)
+    std_daily_return = np.nanstd(daily_returns, axis=-1, ddof=1)
+    sharpe_ratio = (mean_daily_return / std_daily_return) * np.sqrt(252)
+
+    # Maximum Drawdown
+    rolling_max = np.maximum.accumulate(values, axis=-1)
+    max_drawdown = (values / rolling_max - 1).min(axis=-1)
+
+    return sharpe_ratio, max_drawdown
+
 class Backtester:
     def __init__(self, agent, ticker, start_date, end_date, initial_capital):
         self.agent = agent
@@ -14,53 +36,70 @@ class Backtester:
         self.end_date = end_date
         self.initial_capital = initial_capital
         self.portfolio = {"cash": initial_capital, "stock": 0}
-        self.portfolio_values = []
+        self.dates = pd.date_range(start_date, end_date, freq="B", name="Date")
+        self.portfolio_values = np.full(len(self.dates), np.nan)
+        self.log_rows = []
 
     def parse_action(self, agent_output):
         try:
             # Expect JSON output from agent
-            import json
             decision = json.loads(agent_output)
             return decision["action"], decision["quantity"]
-        except:
+        except (json.JSONDecodeError, KeyError, TypeError):
             print(f"Error parsing action: {agent_output}")
             return "hold", 0
 
     def execute_trade(self, action, quantity, current_price):
         """Validate and execute trades based on portfolio constraints"""
+        cash = self.portfolio["cash"]
+        stock = self.portfolio["stock"]
+
         if action == "buy" and quantity > 0:
             cost = quantity * current_price
-            if cost <= self.portfolio["cash"]:
-                self.portfolio["stock"] += quantity
-                self.portfolio["cash"] -= cost
-                return quantity
-            else:
+            if cost > cash:
                 # Calculate maximum affordable quantity
-                max_quantity = self.portfolio["cash"] // current_price
-                if max_quantity > 0:
-                    self.portfolio["stock"] += max_quantity
-                    self.portfolio["cash"] -= max_quantity * current_price
-                    return max_quantity
-                return 0
+                quantity = cash // current_price
+                if quantity <= 0:
+                    return 0
+                cost = quantity * current_price
+            self.portfolio["stock"] = stock + quantity
+            self.portfolio["cash"] = cash - cost
+            return quantity
         elif action == "sell" and quantity > 0:
-            quantity = min(quantity, self.portfolio["stock"])
-            if quantity > 0:
-                self.portfolio["cash"] += quantity * current_price
-                self.portfolio["stock"] -= quantity
-                return quantity
-            return 0
+            quantity = min(quantity, stock)
+            if quantity <= 0:
+                return 0
+            self.portfolio["cash"] = cash + quantity * current_price
+            self.portfolio["stock"] = stock - quantity
+            return quantity
         return 0
 
     def run_backtest(self):
-        dates = pd.date_range(self.start_date, self.end_date, freq="B")
+        dates = self.dates
 
         print("\nStarting backtest...")
-        print(f"{'Date':<12} {'Ticker':<6} {'Action':<6} {'Quantity':>8} {'Price':>8} {'Cash':>12} {'Stock':>8} {'Total Value':>12}")
-        print("-" * 70)
 
-        for current_date in dates:
-            lookback_start = (current_date - timedelta(days=30)).strftime("%Y-%m-%d")
-            current_date_str = current_date.strftime("%Y-%m-%d")
+        # Fetch the whole window once and slice it per day
+        prices_start = (pd.to_datetime(self.start_date) - timedelta(days=30)).strftime("%Y-%m-%d")
+        prices_df = get_price_data(self.ticker, prices_start, self.end_date)
+
+        # Position of the latest close on or before each backtest date
+        trading_days = prices_df.index
+        if trading_days.tz is not None:
+            trading_days = trading_days.tz_localize(None)
+        close_prices = prices_df["close"].to_numpy()
+        price_positions = np.searchsorted(trading_days.normalize().values, dates.values, side="right") - 1
+        if (price_positions < 0).any():
+            first_missing = dates[price_positions < 0][0].strftime("%Y-%m-%d")
+            raise ValueError(f"No price data for {self.ticker} on or before {first_missing}")
+
+        # Format the daily and lookback dates once up front
+        date_strs = dates.strftime("%Y-%m-%d").to_numpy()
+        lookback_strs = (dates - pd.Timedelta(days=30)).strftime("%Y-%m-%d").to_numpy()
+
+        for i in range(len(dates)):
+            lookback_start = lookback_strs[i]
+            current_date_str = date_strs[i]
 
             agent_output = self.agent(
                 ticker=self.ticker,
@@ -70,8 +109,7 @@ class Backtester:
             )
 
             action, quantity = self.parse_action(agent_output)
-            df = get_price_data(self.ticker, lookback_start, current_date_str)
-            current_price = df.iloc[-1]['close']
+            current_price = close_prices[price_positions[i]]
 
             # Execute the trade with validation
             executed_quantity = self.execute_trade(action, quantity, current_price)
@@ -81,19 +119,34 @@ class Backtester:
             self.portfolio["portfolio_value"] = total_value
 
             # Log the current state with executed quantity
-            print(
-                f"{current_date.strftime('%Y-%m-%d'):<12} {self.ticker:<6} {action:<6} {executed_quantity:>8} {current_price:>8.2f} "
-                f"{self.portfolio['cash']:>12.2f} {self.portfolio['stock']:>8} {total_value:>12.2f}"
+            self.log_rows.append(
+                (current_date_str, action, executed_quantity, current_price,
+                 self.portfolio["cash"], self.portfolio["stock"], total_value)
             )
 
             # Record the portfolio value
-            self.portfolio_values.append(
-                {"Date": current_date, "Portfolio Value": total_value}
-            )
+            self.portfolio_values[i] = total_value
+
+        self.print_log()
+
+    def print_log(self):
+        """Print the buffered trade log as a single write."""
+        lines = [
+            f"{'Date':<12} {'Ticker':<6} {'Action':<6} {'Quantity':>8} {'Price':>8} {'Cash':>12} {'Stock':>8} {'Total Value':>12}",
+            "-" * 70,
+        ]
+        lines.extend(
+            f"{date:<12} {self.ticker:<6} {action:<6} {quantity:>8} {price:>8.2f} "
+            f"{cash:>12.2f} {stock:>8} {total_value:>12.2f}"
+            for date, action, quantity, price, cash, stock, total_value in self.log_rows
+        )
+        print("\n".join(lines))
 
-    def analyze_performance(self):
+    def analyze_performance(self, plot=True):
         # Convert portfolio values to DataFrame
-        performance_df = pd.DataFrame(self.portfolio_values).set_index("Date")
+        performance_df = pd.DataFrame(
+            {"Portfolio Value": self.portfolio_values}, index=self.dates
+        )
 
         # Calculate total return
         total_return = (
@@ -101,29 +154,23 @@ class Backtester:
                        ) / self.initial_capital
         print(f"Total Return: {total_return * 100:.2f}%")
 
-        # Plot the portfolio value over time
-        performance_df["Portfolio Value"].plot(
-            title="Portfolio Value Over Time", figsize=(12, 6)
+        # Calculate Sharpe Ratio and Maximum Drawdown
+        sharpe_ratio, max_drawdown = calculate_performance_metrics(
+            performance_df["Portfolio Value"].to_numpy()
         )
-        plt.ylabel("Portfolio Value ($)")
-        plt.xlabel("Date")
-        plt.show()
-
-        # Compute daily returns
-        performance_df["Daily Return"] = performance_df["Portfolio Value"].pct_change()
-
-        # Calculate Sharpe Ratio (assuming 252 trading days in a year)
-        mean_daily_return = performance_df["Daily Return"].mean()
-        std_daily_return = performance_df["Daily Return"].std()
-        sharpe_ratio = (mean_daily_return / std_daily_return) * (252 ** 0.5)
         print(f"Sharpe Ratio: {sharpe_ratio:.2f}")
-
-        # Calculate Maximum Drawdown
-        rolling_max = performance_df["Portfolio Value"].cummax()
-        drawdown = performance_df["Portfolio Value"] / rolling_max - 1
-        max_drawdown = drawdown.min()
         print(f"Maximum Drawdown: {max_drawdown * 100:.2f}%")
 
+        # Plot the portfolio value over time, after the metrics since show() blocks
+        if plot:
+            ax = performance_df["Portfolio Value"].plot(
+                title="Portfolio Value Over Time", figsize=(12, 6)
+            )
+            plt.ylabel("Portfolio Value ($)")
+            plt.xlabel("Date")
+            plt.show()
+            plt.close(ax.figure)
+
         return performance_df
     
 ### 4. Run the Backtest #####
@@ -136,6 +183,7 @@ if __name__ == "__main__":
     parser.add_argument('--end_date', type=str, default=datetime.now().strftime('%Y-%m-%d'), help='End date in YYYY-MM-DD format')
     parser.add_argument('--start_date', type=str, default=(datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d'), help='Start date in YYYY-MM-DD format')
     parser.add_argument('--initial_capital', type=float, default=100000, help='Initial capital amount (default: 100000)')
+    parser.add_argument('--plot', action=argparse.BooleanOptionalAction, default=True, help='Plot the portfolio value over time (default: --plot)')
 
     args = parser.parse_args()
 
@@ -150,4 +198,4 @@ if __name__ == "__main__":
 
     # Run the backtesting process
     backtester.run_backtest()
-    performance_df = backtester.analyze_performance()
+    performance_df = backtester.analyze_performance(plot=args.plot)
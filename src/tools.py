@@ -1,10 +1,25 @@
+from datetime import datetime
+import json
 import os
+import tempfile
 
+import numpy as np
 import pandas as pd
 import requests
+from numba import njit
+
+PRICE_CACHE_DIR = os.environ.get("PRICE_CACHE_DIR", ".cache/prices")
   
 def get_prices(ticker, start_date, end_date):
-    """Fetch price data from the API."""
+    """Fetch price data from the API, reusing cached responses from disk."""
+    cache_path = os.path.join(PRICE_CACHE_DIR, f"{ticker}_{start_date}_{end_date}.json")
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        # Missing or unreadable cache entries are fetched again
+        pass
+
     headers = {"X-API-KEY": os.environ.get("FINANCIAL_DATASETS_API_KEY")}
     url = (
         f"https://api.financialdatasets.ai/prices/"
@@ -23,17 +38,30 @@ def get_prices(ticker, start_date, end_date):
     prices = data.get("prices")
     if not prices:
         raise ValueError("No price data returned")
+
+    # Only cache ranges that have closed; today's prices can still change
+    if end_date < datetime.now().strftime('%Y-%m-%d'):
+        os.makedirs(PRICE_CACHE_DIR, exist_ok=True)
+        # Write to a temporary file first so an interrupted run never leaves a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=PRICE_CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(prices, f)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
     return prices
 
 def prices_to_df(prices):
     """Convert prices to a DataFrame."""
     df = pd.DataFrame(prices)
-    df["Date"] = pd.to_datetime(df["time"])
-    df.set_index("Date", inplace=True)
+    df.index = pd.DatetimeIndex(pd.to_datetime(df["time"]), name="Date")
     numeric_cols = ["open", "close", "high", "low", "volume"]
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-    df.sort_index(inplace=True)
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
+    # The API usually returns prices in date order already
+    if not df.index.is_monotonic_increasing:
+        df.sort_index(inplace=True)
     return df
 
 # Update the get_price_data function to use the new functions
@@ -71,39 +99,130 @@ def calculate_confidence_level(signals):
     confidence = min(max(diff_change / signals['current_price'], 0), 1)
     return confidence
 
-def calculate_macd(prices_df):
-    ema_12 = prices_df['close'].ewm(span=12, adjust=False).mean()
-    ema_26 = prices_df['close'].ewm(span=26, adjust=False).mean()
-    macd_line = ema_12 - ema_26
-    signal_line = macd_line.ewm(span=9, adjust=False).mean()
+@njit(cache=True)
+def _ewm_update(mean, old_weight, value, alpha):
+    """One step of ewm(adjust=False).mean(), skipping NaN values like pandas."""
+    if np.isnan(mean):
+        return value, 1.0
+    old_weight *= 1 - alpha
+    if not np.isnan(value):
+        mean = (old_weight * mean + alpha * value) / (old_weight + alpha)
+        old_weight = 1.0
+    return mean, old_weight
+
+@njit(cache=True)
+def _macd(close, fast_span, slow_span, signal_span):
+    """MACD and signal lines from three fused ewm(adjust=False) recurrences."""
+    n = len(close)
+    macd_line = np.empty(n)
+    signal_line = np.empty(n)
+    fast_alpha = 2 / (fast_span + 1)
+    slow_alpha = 2 / (slow_span + 1)
+    signal_alpha = 2 / (signal_span + 1)
+    ema_fast, fast_weight = np.nan, 1.0
+    ema_slow, slow_weight = np.nan, 1.0
+    signal, signal_weight = np.nan, 1.0
+    for i in range(n):
+        ema_fast, fast_weight = _ewm_update(ema_fast, fast_weight, close[i], fast_alpha)
+        ema_slow, slow_weight = _ewm_update(ema_slow, slow_weight, close[i], slow_alpha)
+        macd = ema_fast - ema_slow
+        signal, signal_weight = _ewm_update(signal, signal_weight, macd, signal_alpha)
+        macd_line[i] = macd
+        signal_line[i] = signal
     return macd_line, signal_line
 
+@njit(cache=True)
+def _wilder_averages(close, period):
+    """Wilder-smoothed average gain and loss, seeded with a simple average."""
+    n = len(close)
+    avg_gain = np.full(n, np.nan)
+    avg_loss = np.full(n, np.nan)
+    if n <= period:
+        return avg_gain, avg_loss
+    gain_sum = 0.0
+    loss_sum = 0.0
+    for i in range(1, period + 1):
+        change = close[i] - close[i - 1]
+        if change > 0:
+            gain_sum += change
+        elif change < 0:
+            loss_sum -= change
+    avg_gain[period] = gain_sum / period
+    avg_loss[period] = loss_sum / period
+    for i in range(period + 1, n):
+        change = close[i] - close[i - 1]
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        avg_gain[i] = (avg_gain[i - 1] * (period - 1) + gain) / period
+        avg_loss[i] = (avg_loss[i - 1] * (period - 1) + loss) / period
+    return avg_gain, avg_loss
+
+@njit(cache=True)
+def _rolling_mean_std(values, window):
+    """Rolling mean and sample standard deviation using Welford's method.
+
+    The running mean and sum of squared deviations are updated as each
+    value enters and leaves the window; windows holding a NaN stay NaN.
+    """
+    n = len(values)
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    count = 0
+    m = 0.0
+    m2 = 0.0
+    for i in range(n):
+        x = values[i]
+        if not np.isnan(x):
+            count += 1
+            delta = x - m
+            m += delta / count
+            m2 += delta * (x - m)
+        if i >= window:
+            old = values[i - window]
+            if not np.isnan(old):
+                count -= 1
+                if count == 0:
+                    m = 0.0
+                    m2 = 0.0
+                else:
+                    delta = old - m
+                    m -= delta / count
+                    m2 -= delta * (old - m)
+        if count == window:
+            mean[i] = m
+            std[i] = np.sqrt(max(m2, 0.0) / (window - 1))
+    return mean, std
+
+def calculate_macd(prices_df):
+    macd_line, signal_line = _macd(prices_df['close'].to_numpy(dtype=np.float64), 12, 26, 9)
+    return (
+        pd.Series(macd_line, index=prices_df.index),
+        pd.Series(signal_line, index=prices_df.index),
+    )
+
 def calculate_rsi(prices_df, period=14):
-    delta = prices_df['close'].diff()
-    gain = (delta.where(delta > 0, 0)).fillna(0)
-    loss = (-delta.where(delta < 0, 0)).fillna(0)
-    avg_gain = gain.rolling(window=period).mean()
-    avg_loss = loss.rolling(window=period).mean()
-    rs = avg_gain / avg_loss
+    avg_gain, avg_loss = _wilder_averages(prices_df['close'].to_numpy(dtype=np.float64), period)
+    # No losses in the window means maximum strength rather than a division by zero
+    rs = np.divide(avg_gain, avg_loss, out=np.full_like(avg_gain, np.inf), where=avg_loss != 0)
     rsi = 100 - (100 / (1 + rs))
-    return rsi
+    # A flat window has neither gains nor losses, so it is neutral
+    rsi[(avg_gain == 0) & (avg_loss == 0)] = 50
+    return pd.Series(rsi, index=prices_df.index)
 
 def calculate_bollinger_bands(prices_df, window=20):
-    sma = prices_df['close'].rolling(window).mean()
-    std_dev = prices_df['close'].rolling(window).std()
+    sma, std_dev = _rolling_mean_std(prices_df['close'].to_numpy(dtype=np.float64), window)
     upper_band = sma + (std_dev * 2)
     lower_band = sma - (std_dev * 2)
-    return upper_band, lower_band
+    return (
+        pd.Series(upper_band, index=prices_df.index),
+        pd.Series(lower_band, index=prices_df.index),
+    )
 
 
 def calculate_obv(prices_df):
-    obv = [0]
-    for i in range(1, len(prices_df)):
-        if prices_df['close'].iloc[i] > prices_df['close'].iloc[i - 1]:
-            obv.append(obv[-1] + prices_df['volume'].iloc[i])
-        elif prices_df['close'].iloc[i] < prices_df['close'].iloc[i - 1]:
-            obv.append(obv[-1] - prices_df['volume'].iloc[i])
-        else:
-            obv.append(obv[-1])
-    prices_df['OBV'] = obv
+    direction = np.sign(prices_df['close'].diff().fillna(0).to_numpy())
+    volume = prices_df['volume'].to_numpy()
+    # Unchanged closes leave OBV as is, even when their volume is missing
+    flow = np.where(direction > 0, volume, np.where(direction < 0, -volume, 0))
+    prices_df['OBV'] = flow.cumsum()
     return prices_df['OBV']
\ No newline at end of file